@@ -4,17 +4,20 @@ import lucene
 import traceback
 import json
 from datetime import datetime
-from java.nio.file import Paths
 from org.apache.lucene.analysis.standard import StandardAnalyzer
 from org.apache.lucene.document import Document, Field, TextField, StringField, StoredField
 from org.apache.lucene.index import IndexWriter, IndexWriterConfig, DirectoryReader, Term
-from org.apache.lucene.store import SimpleFSDirectory
 from org.apache.lucene.search import IndexSearcher, TermQuery
 from dotenv import load_dotenv
 
 # Import custom modules
 from utils.db_connector import get_db_data
 from utils.file_processor import process_documents
+from utils.metrics import metrics, profiling
+from utils.suggester import SuggestionBuilder
+from utils.index_store import (open_directory, new_generation_path, publish_generation,
+                               cleanup_generations, discard_generation, warm_up, SUGGEST_FILENAME,
+                               POINTER_FILE)
 
 # Initialize Lucene VM
 lucene.initVM(vmargs=['-Djava.awt.headless=true'])
@@ -26,53 +29,99 @@ load_dotenv()
 # Paths for indexes
 INDEX_DIR = os.environ.get('INDEX_DIR', '../index')
 DOCUMENTS_DIR = os.environ.get('DOCUMENTS_DIR', '../documents')
+SUGGEST_FILE = os.environ.get('SUGGEST_FILE')  # Defaults to suggestions.json inside the index generation
 
 def create_index():
-    """Create or update the Lucene index with both database data and document content"""
+    """Build a new index generation with database data and document content, then publish it
+
+    The new index is written next to the live one and readers are switched over
+    only after it has been committed and warmed up.
+    """
     
     # Ensure index directory exists
     if not os.path.exists(INDEX_DIR):
         os.makedirs(INDEX_DIR)
     
-    print(f"Creating index in {INDEX_DIR}")
+    generation_path = new_generation_path(INDEX_DIR)
+    print(f"Creating index in {generation_path}")
     
     # Set up Lucene
-    directory = SimpleFSDirectory(Paths.get(INDEX_DIR))
+    directory = open_directory(generation_path)
     analyzer = StandardAnalyzer()
     config = IndexWriterConfig(analyzer)
-    config.setOpenMode(IndexWriterConfig.OpenMode.CREATE)  # This will overwrite existing index
+    config.setOpenMode(IndexWriterConfig.OpenMode.CREATE)
     writer = IndexWriter(directory, config)
+    suggestions = SuggestionBuilder()
+    doc_count = 0
+    built = False
     
     try:
         # Process documents
         print(f"Processing documents from {DOCUMENTS_DIR}")
         if os.path.exists(DOCUMENTS_DIR):
-            doc_count = index_documents(writer)
+            doc_count = index_documents(writer, suggestions)
             print(f"Indexed {doc_count} documents")
         else:
             print(f"Documents directory {DOCUMENTS_DIR} does not exist")
             
         # Process database
         print("Processing database data")
-        db_count = index_database(writer)
+        db_count = index_database(writer, suggestions)
         print(f"Indexed {db_count} database records")
         
         # Optimize and close
-        writer.commit()
-        print(f"Indexing completed: {doc_count + db_count} total items indexed")
-        return doc_count + db_count
+        with metrics.timer('commit'):
+            writer.commit()
+        
+        # Build type-ahead suggestions from what was just indexed
+        suggest_file = SUGGEST_FILE or os.path.join(generation_path, SUGGEST_FILENAME)
+        with metrics.timer('suggestions'):
+            suggestion_count = suggestions.save(suggest_file)
+        print(f"Saved {suggestion_count} suggestions to {suggest_file}")
+        built = True
         
     except Exception as e:
         writer.rollback()
         print(f"Error during indexing: {str(e)}")
         traceback.print_exc()
-        return 0
     finally:
         writer.close()
+        directory.close()
+    
+    if not built:
+        discard_generation(generation_path)
+        return 0
+    
+    try:
+        # Warm up the new generation before readers are switched to it
+        with metrics.timer('warm_up'):
+            warm_up(generation_path, analyzer)
+    except Exception as e:
+        print(f"Error warming up index generation: {str(e)}")
+        traceback.print_exc()
+        discard_generation(generation_path)
+        return 0
+    
+    try:
+        publish_generation(INDEX_DIR, generation_path)
+        print(f"Published index generation {os.path.basename(generation_path)}")
+    except OSError as e:
+        # The generation is complete; keep it so the swap can be retried without rebuilding
+        print(f"Error publishing index generation {generation_path}: {str(e)}")
+        print(f"Write '{os.path.basename(generation_path)}' to {os.path.join(INDEX_DIR, POINTER_FILE)} to publish it")
+        return 0
+    
+    removed = cleanup_generations(INDEX_DIR)
+    if removed:
+        print(f"Removed old index data: {', '.join(removed)}")
+    
+    print(f"Indexing completed: {doc_count + db_count} total items indexed")
+    return doc_count + db_count
 
-def index_documents(writer):
+def index_documents(writer, suggestions=None):
     """Index document files from the documents directory"""
-    doc_data = process_documents(DOCUMENTS_DIR)
+    with metrics.timer('extract_documents'):
+        doc_data = process_documents(DOCUMENTS_DIR)
     count = 0
     
     for item in doc_data:
@@ -87,18 +136,28 @@ def index_documents(writer):
             doc.add(TextField("content", item['content'], Field.Store.YES))
             doc.add(StringField("path", item['path'], Field.Store.YES))
             doc.add(StringField("extension", item['extension'], Field.Store.YES))
+            for duplicate in item.get('duplicates', []):
+                doc.add(StringField("duplicate_path", duplicate, Field.Store.YES))
             
-            # Add document to index
-            writer.addDocument(doc)
+            # Add document to index (analysis happens inside addDocument)
+            with metrics.timer('analyze', labels={'type': 'document'}):
+                writer.addDocument(doc)
+            metrics.inc('indexed_docs', labels={'type': 'document'})
             count += 1
+            
+            if suggestions is not None:
+                suggestions.add_filename(item['filename'])
+                suggestions.add_content(item['content'])
         except Exception as e:
             print(f"Error indexing document {item['filename']}: {str(e)}")
+            metrics.inc('index_errors', labels={'type': 'document'})
     
     return count
 
-def index_database(writer):
+def index_database(writer, suggestions=None):
     """Index data from PostgreSQL database"""
-    db_data = get_db_data()
+    with metrics.timer('fetch_database'):
+        db_data = get_db_data()
     count = 0
     
     for record in db_data:
@@ -112,24 +171,52 @@ def index_database(writer):
             doc.add(StringField("table", record['table'], Field.Store.YES)) 
             doc.add(StringField("column", record['column'], Field.Store.YES))
             doc.add(TextField("content", record['content'], Field.Store.YES))
+            # Every table and column the value appears in is searchable; only the
+            # count and the first few locations are stored
+            for table in sorted(record.get('tables', set()) - {record['table']}):
+                doc.add(StringField("table", table, Field.Store.NO))
+            for column in sorted(record.get('columns', set()) - {record['column']}):
+                doc.add(StringField("column", column, Field.Store.NO))
+            doc.add(StoredField("occurrences", record.get('occurrences', 1)))
+            doc.add(StoredField("locations", json.dumps(record.get('locations', []))))
             
-            # Add document to index
-            writer.addDocument(doc)
+            # Add document to index (analysis happens inside addDocument)
+            with metrics.timer('analyze', labels={'type': 'database'}):
+                writer.addDocument(doc)
+            metrics.inc('indexed_docs', labels={'type': 'database'})
             count += 1
+            
+            if suggestions is not None:
+                suggestions.add_value(record['content'], record.get('occurrences', 1))
         except Exception as e:
             print(f"Error indexing database record: {str(e)}")
+            metrics.inc('index_errors', labels={'type': 'database'})
     
     return count
 
 if __name__ == "__main__":
     start_time = datetime.now()
-    indexed_count = create_index()
+    with profiling('index'):
+        indexed_count = create_index()
     end_time = datetime.now()
     
+    time_taken = (end_time - start_time).total_seconds()
+    metrics.add_time('total', time_taken)
+    metrics.dump('index')
+    
     result = {
         "success": indexed_count > 0,
         "indexed_count": indexed_count,
-        "time_taken": (end_time - start_time).total_seconds(),
+        "time_taken": time_taken,
+        "docs_per_second": round(indexed_count / time_taken, 2) if time_taken > 0 else 0,
+        "stages": {
+            "extract_documents": round(metrics.stage_seconds('extract_documents'), 6),
+            "fetch_database": round(metrics.stage_seconds('fetch_database'), 6),
+            "analyze": round(metrics.stage_seconds('analyze'), 6),
+            "commit": round(metrics.stage_seconds('commit'), 6),
+            "suggestions": round(metrics.stage_seconds('suggestions'), 6),
+            "warm_up": round(metrics.stage_seconds('warm_up'), 6)
+        },
         "timestamp": end_time.isoformat()
     }
     
@@ -2,15 +2,19 @@ import os
 import sys
 import lucene
 import json
-from java.nio.file import Paths
+import time
 from org.apache.lucene.analysis.standard import StandardAnalyzer
-from org.apache.lucene.index import DirectoryReader
-from org.apache.lucene.store import SimpleFSDirectory
+from org.apache.lucene.index import DirectoryReader, LeafReaderContext
 from org.apache.lucene.search import IndexSearcher, BooleanQuery, BooleanClause, TermQuery, MatchAllDocsQuery
+from org.apache.lucene.search import TopScoreDocCollector, TimeLimitingCollector
+from org.apache.lucene.search import BoostQuery, MultiTermQuery, PrefixQuery, WildcardQuery, RegexpQuery
 from org.apache.lucene.queryparser.classic import QueryParser
 from org.apache.lucene.search.highlight import Highlighter, QueryScorer, SimpleHTMLFormatter, SimpleFragmenter
 from dotenv import load_dotenv
 
+from utils.metrics import metrics, profiling
+from utils.index_store import current_index_path, open_directory
+
 # Initialize Lucene VM
 lucene.initVM(vmargs=['-Djava.awt.headless=true'])
 
@@ -22,51 +26,204 @@ INDEX_DIR = os.environ.get('INDEX_DIR', '../index')
 MAX_RESULTS = 100
 FRAGMENT_SIZE = 150  # Size for highlighted fragments
 
+def env_int(name, default):
+    """Read a positive integer setting, falling back to the default if it is malformed"""
+    raw = os.environ.get(name, '').strip()
+    try:
+        value = int(raw) if raw else default
+    except ValueError:
+        print(f"Warning: invalid {name}={raw!r}, using {default}")
+        return default
+    return value if value > 0 else default
+
+# Tail-latency controls. Wildcard and prefix terms keep Lucene's default
+# constant-score rewrite, which adds no boolean clauses per expanded term.
+# Its cost is not covered by the search time budget, though: every matching
+# term is walked while the scorer is built, before the collector checks the
+# clock. check_expansions() bounds that work before the search runs.
+SEARCH_TIMEOUT_MS = env_int('SEARCH_TIMEOUT_MS', 2000)  # Budget for search + highlighting
+TOTAL_HITS_THRESHOLD = env_int('TOTAL_HITS_THRESHOLD', 1000)  # Count hits exactly up to this
+MAX_CLAUSES = env_int('MAX_CLAUSES', 256)  # Max boolean clauses in a query
+MAX_WILDCARD_EXPANSIONS = env_int('MAX_WILDCARD_EXPANSIONS', 512)  # Max index terms a wildcard/prefix/regexp may match
+MIN_PREFIX_LENGTH = env_int('MIN_PREFIX_LENGTH', 2)  # Literal characters required before * or ?
+MAX_HIGHLIGHT_CHARS = 50000  # Characters of a document the highlighter may analyze
+
+def count_clauses(query):
+    """Count leaf clauses in a (possibly nested) boolean query"""
+    if not BooleanQuery.instance_(query):
+        return 1
+    total = 0
+    for clause in BooleanQuery.cast_(query).clauses():
+        total += count_clauses(clause.getQuery())
+    return total
+
+def multi_term_queries(query):
+    """Yield the wildcard, prefix and regexp queries inside a (possibly nested) query"""
+    if BooleanQuery.instance_(query):
+        for clause in BooleanQuery.cast_(query).clauses():
+            yield from multi_term_queries(clause.getQuery())
+    elif BoostQuery.instance_(query):
+        yield from multi_term_queries(BoostQuery.cast_(query).getQuery())
+    elif (WildcardQuery.instance_(query) or PrefixQuery.instance_(query)
+          or RegexpQuery.instance_(query)):
+        yield query
+
+def literal_prefix(query):
+    """Characters fixed before the first wildcard, or None for regexps"""
+    if PrefixQuery.instance_(query):
+        return PrefixQuery.cast_(query).getPrefix().text()
+    if WildcardQuery.instance_(query):
+        text = WildcardQuery.cast_(query).getTerm().text()
+        for i, char in enumerate(text):
+            if char in '*?':
+                return text[:i]
+        return text
+    return None
+
+def check_expansions(reader, query):
+    """Return a reason if a wildcard/prefix/regexp term is too broad, else None
+
+    Counts the index terms each one matches across segments and stops at
+    MAX_WILDCARD_EXPANSIONS, so the check itself stays cheap.
+    """
+    for mtq_query in multi_term_queries(query):
+        prefix = literal_prefix(mtq_query)
+        if prefix is not None and len(prefix) < MIN_PREFIX_LENGTH:
+            return f"'{mtq_query}' needs at least {MIN_PREFIX_LENGTH} characters before the wildcard"
+
+        mtq = MultiTermQuery.cast_(mtq_query)
+        expansions = 0
+        for leaf in reader.leaves():
+            terms = LeafReaderContext.cast_(leaf).reader().terms(mtq.getField())
+            if terms is None:
+                continue
+            terms_enum = mtq.getTermsEnum(terms)
+            while terms_enum.next() is not None:
+                expansions += 1
+                if expansions > MAX_WILDCARD_EXPANSIONS:
+                    return f"'{mtq_query}' matches more than {MAX_WILDCARD_EXPANSIONS} terms"
+    return None
+
+def is_too_many_clauses(error):
+    """True if a JavaError was caused, directly or through a ParseException, by too many clauses"""
+    cause = error.getJavaException()
+    while cause is not None:
+        if IndexSearcher.TooManyClauses.instance_(cause):
+            return True
+        cause = cause.getCause()
+    return False
+
+def too_complex_response(query_str, detail, reason='too_many_clauses'):
+    metrics.inc('rejected_queries', labels={'reason': reason})
+    return error_response(f"Query too complex: {detail}", query_str)
+
+def error_response(message, query_str):
+    return {
+        "error": message,
+        "query": query_str,
+        "total": 0,
+        "resultados": []
+    }
+
 def search(query_str):
     """Search in Lucene index and return results"""
     
-    # Check if index exists
-    if not os.path.exists(INDEX_DIR):
-        return {
-            "error": "Index not found. Please run indexing first.",
-            "query": query_str,
-            "total": 0,
-            "resultados": []
-        }
+    # Resolve the published index generation and check it exists
+    index_path = current_index_path(INDEX_DIR)
+    if not os.path.exists(index_path):
+        return error_response("Index not found. Please run indexing first.", query_str)
     
     print(f"Searching for: {query_str}")
+    deadline = time.perf_counter() + SEARCH_TIMEOUT_MS / 1000.0
+    partial = False
     
     try:
         # Set up Lucene searcher
-        directory = SimpleFSDirectory(Paths.get(INDEX_DIR))
-        reader = DirectoryReader.open(directory)
-        searcher = IndexSearcher(reader)
+        with metrics.timer('open_reader'):
+            directory = open_directory(index_path)
+            reader = DirectoryReader.open(directory)
+            searcher = IndexSearcher(reader)
+        IndexSearcher.setMaxClauseCount(MAX_CLAUSES)
         analyzer = StandardAnalyzer()
         
         # Prepare the query parser for content field
-        parser = QueryParser("content", analyzer)
-        parsed_query = parser.parse(query_str)
+        with metrics.timer('parse'):
+            parser = QueryParser("content", analyzer)
+            try:
+                parsed_query = parser.parse(query_str)
+            except lucene.JavaError as e:
+                if not is_too_many_clauses(e):
+                    raise
+                reader.close()
+                return too_complex_response(query_str, f"too many terms (max {MAX_CLAUSES} clauses)")
+        
+        clause_count = count_clauses(parsed_query)
+        if clause_count > MAX_CLAUSES:
+            reader.close()
+            return too_complex_response(query_str, f"{clause_count} clauses (max {MAX_CLAUSES})")
+        
+        with metrics.timer('check_expansions'):
+            expansion_error = check_expansions(reader, parsed_query)
+        if expansion_error:
+            reader.close()
+            return too_complex_response(query_str, expansion_error, reason='wildcard_expansion')
         
         # Setup highlighter for search results
         formatter = SimpleHTMLFormatter("<mark>", "</mark>")
         scorer = QueryScorer(parsed_query)
         highlighter = Highlighter(formatter, scorer)
         highlighter.setTextFragmenter(SimpleFragmenter(FRAGMENT_SIZE))
+        highlighter.setMaxDocCharsToAnalyze(MAX_HIGHLIGHT_CHARS)
         
-        # Execute search
-        top_docs = searcher.search(parsed_query, MAX_RESULTS)
-        print(f"Found {top_docs.totalHits.value} hits.")
+        # Execute search within the time budget; hits are counted exactly
+        # only up to TOTAL_HITS_THRESHOLD
+        collector = TopScoreDocCollector.create(MAX_RESULTS, TOTAL_HITS_THRESHOLD)
+        budget_ms = max(1, int((deadline - time.perf_counter()) * 1000))
+        limited = TimeLimitingCollector(collector, TimeLimitingCollector.getGlobalCounter(), budget_ms)
+        with metrics.timer('search'):
+            try:
+                searcher.search(parsed_query, limited)
+            except lucene.JavaError as e:
+                if is_too_many_clauses(e):
+                    reader.close()
+                    return too_complex_response(
+                        query_str, f"query expands to too many clauses (max {MAX_CLAUSES})")
+                if not TimeLimitingCollector.TimeExceededException.instance_(e.getJavaException()):
+                    raise
+                partial = True
+                metrics.inc('timeouts', labels={'phase': 'search'})
+        top_docs = collector.topDocs()
+        total_hits = top_docs.totalHits.value
+        hits_approximate = partial or top_docs.totalHits.relation.toString() != 'EQUAL_TO'
+        metrics.inc('hits', total_hits)
+        print(f"Found {'>=' if hits_approximate else ''}{total_hits} hits.")
         
         # Process results
         results = []
         for score_doc in top_docs.scoreDocs:
-            doc = searcher.doc(score_doc.doc)
+            # Out of budget: keep returning hits but skip highlighting
+            over_budget = time.perf_counter() > deadline
+            if over_budget and not partial:
+                partial = True
+                metrics.inc('timeouts', labels={'phase': 'highlight'})
+            
+            with metrics.timer('fetch_stored'):
+                doc = searcher.doc(score_doc.doc)
             doc_type = doc.get("type")
             
             # Highlight the content that matches the query
             content = doc.get("content")
-            token_stream = analyzer.tokenStream("content", content)
-            highlighted_text = highlighter.getBestFragments(token_stream, content, 3, "...")
+            highlighted_text = None
+            if not over_budget:
+                with metrics.timer('highlight'):
+                    token_stream = analyzer.tokenStream("content", content)
+                    try:
+                        highlighted_text = highlighter.getBestFragments(token_stream, content, 3, "...")
+                    except lucene.JavaError as e:
+                        # Wildcards expanded over this document's terms can exceed MAX_CLAUSES
+                        if not is_too_many_clauses(e):
+                            raise
+                        metrics.inc('highlight_skipped', labels={'reason': 'too_many_clauses'})
             
             if not highlighted_text:
                 # If no highlight, just take a snippet
@@ -76,13 +233,16 @@ def search(query_str):
                 results.append({
                     "tabla": "documento",
                     "columna": "nombre_archivo" if query_str.lower() in doc.get("filename").lower() else "contenido",
-                    "resultado": f"Archivo: {doc.get('filename')} - {highlighted_text}"
+                    "resultado": f"Archivo: {doc.get('filename')} - {highlighted_text}",
+                    "duplicados": list(doc.getValues("duplicate_path"))
                 })
             elif doc_type == "database":
                 results.append({
                     "tabla": doc.get("table"),
                     "columna": doc.get("column"),
-                    "resultado": highlighted_text
+                    "resultado": highlighted_text,
+                    "ocurrencias": int(doc.get("occurrences") or 1),
+                    "ubicaciones": json.loads(doc.get("locations") or "[]")
                 })
         
         reader.close()
@@ -91,24 +251,29 @@ def search(query_str):
         return {
             "query": query_str,
             "total": len(results),
-            "resultados": results
+            "resultados": results,
+            "total_hits": total_hits,
+            "total_hits_approximate": hits_approximate,
+            "partial": partial,
+            "timings": {
+                stage: round(metrics.stage_seconds(stage), 6)
+                for stage in ('open_reader', 'parse', 'search', 'fetch_stored', 'highlight')
+            }
         }
         
     except Exception as e:
         import traceback
         traceback.print_exc()
-        return {
-            "error": str(e),
-            "query": query_str,
-            "total": 0,
-            "resultados": []
-        }
+        return error_response(str(e), query_str)
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
         print(json.dumps({"error": "Missing query parameter"}))
     else:
         query_str = sys.argv[1]
-        results = search(query_str)
+        with profiling('search'):
+            with metrics.timer('total', histogram=True):
+                results = search(query_str)
+        metrics.dump('search')
         # Output as JSON for parsing by Node.js
         print(json.dumps(results))
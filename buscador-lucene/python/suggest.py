@@ -0,0 +1,97 @@
+import os
+import sys
+import json
+import time
+from dotenv import load_dotenv
+
+from utils.suggester import Suggester, DEFAULT_LIMIT
+from utils.index_store import current_index_path, SUGGEST_FILENAME
+
+# Load environment variables
+load_dotenv()
+
+# Constants
+INDEX_DIR = os.environ.get('INDEX_DIR', '../index')
+SUGGEST_FILE = os.environ.get('SUGGEST_FILE')  # Defaults to suggestions.json inside the index generation
+
+# Suggester kept in memory by --serve, with the file and mtime it was loaded from
+_loaded = {'path': None, 'mtime': None, 'suggester': None}
+
+def suggestions_path():
+    return SUGGEST_FILE or os.path.join(current_index_path(INDEX_DIR), SUGGEST_FILENAME)
+
+def get_suggester():
+    """Return the in-memory suggester, reloading it when a new index generation is published"""
+    path = suggestions_path()
+    try:
+        mtime = os.path.getmtime(path)
+    except OSError:
+        return None
+    if _loaded['suggester'] is None or _loaded['path'] != path or _loaded['mtime'] != mtime:
+        _loaded['suggester'] = Suggester.load(path)
+        _loaded['path'] = path
+        _loaded['mtime'] = mtime
+    return _loaded['suggester']
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    """Return type-ahead suggestions for a prefix"""
+
+    start = time.perf_counter()
+    suggester = get_suggester()
+    loaded = time.perf_counter()
+
+    # Check if suggestions exist
+    if suggester is None:
+        return {
+            "error": "Suggestions not found. Please run indexing first.",
+            "prefix": prefix,
+            "sugerencias": []
+        }
+
+    suggestions = suggester.suggest(prefix, limit)
+    end = time.perf_counter()
+
+    return {
+        "prefix": prefix,
+        "sugerencias": suggestions,
+        "load_ms": round((loaded - start) * 1000, 3),
+        "lookup_ms": round((end - loaded) * 1000, 3)
+    }
+
+def serve():
+    """Answer one JSON request per stdin line ({"q": ..., "limit": ...}) with one JSON line
+
+    Keeps the suggester in memory so each lookup only pays the prefix search,
+    not interpreter start-up and JSON parsing. Used by the Node /suggest route.
+    The first output line reports that the initial load finished; a load error
+    is reported there and retried on the next request instead of exiting.
+    """
+    try:
+        get_suggester()
+        ready = {"ready": True}
+    except Exception as e:
+        ready = {"ready": False, "error": str(e)}
+    sys.stdout.write(json.dumps(ready, ensure_ascii=False) + "\n")
+    sys.stdout.flush()
+    
+    for line in sys.stdin:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            request = json.loads(line)
+            response = suggest(str(request.get('q', '')), int(request.get('limit', DEFAULT_LIMIT)))
+        except Exception as e:
+            response = {"error": str(e), "sugerencias": []}
+        sys.stdout.write(json.dumps(response, ensure_ascii=False) + "\n")
+        sys.stdout.flush()
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == '--serve':
+        serve()
+    elif len(sys.argv) < 2:
+        print(json.dumps({"error": "Missing prefix parameter"}))
+    else:
+        limit = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_LIMIT
+        # Output as JSON for parsing by Node.js
+        print(json.dumps(suggest(sys.argv[1], limit), ensure_ascii=False))
@@ -1,11 +1,23 @@
 import os
+import sys
 import psycopg2
 from psycopg2.extras import RealDictCursor
 from dotenv import load_dotenv
 
+# Allow running this module directly (python utils/<module>.py) as well as through the package
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import metrics
+from utils.dedup import content_hash
+
 # Load environment variables
 load_dotenv()
 
+# Index each distinct value of a column once, carrying every table/row it appears in
+DB_DEDUP = os.environ.get('DB_DEDUP', 'true').lower() in ('1', 'true', 'yes', 'on')
+MAX_LOCATIONS = 20  # Locations kept per deduplicated value; the full count is kept separately
+
 def get_db_connection():
     """Get a connection to the PostgreSQL database"""
     return psycopg2.connect(
@@ -17,8 +29,16 @@ def get_db_connection():
     )
 
 def get_db_data():
-    """Get data from all tables in the PostgreSQL database for indexing"""
+    """Get data from all tables in the PostgreSQL database for indexing
+
+    Each record carries 'occurrences', the 'tables'/'columns' it appears in and
+    up to MAX_LOCATIONS {table, column, row} locations, where row is the primary
+    key (None for tables without one). With DB_DEDUP enabled, repeated values of
+    the same column name share a single record; numeric columns are only merged
+    within their own table, since equal ids in unrelated tables mean nothing.
+    """
     data = []
+    by_hash = {}
     conn = get_db_connection()
     
     try:
@@ -31,10 +51,30 @@ def get_db_data():
             """)
             tables = cursor.fetchall()
             
+            # Primary key columns per table, used to locate rows
+            cursor.execute("""
+                SELECT kcu.table_name, kcu.column_name
+                FROM information_schema.table_constraints tc
+                JOIN information_schema.key_column_usage kcu
+                  ON tc.constraint_name = kcu.constraint_name
+                 AND tc.table_schema = kcu.table_schema
+                 AND tc.table_name = kcu.table_name
+                WHERE tc.table_schema = 'public' AND tc.constraint_type = 'PRIMARY KEY'
+                ORDER BY kcu.table_name, kcu.ordinal_position
+            """)
+            primary_keys = {}
+            for pk_row in cursor.fetchall():
+                primary_keys.setdefault(pk_row['table_name'], []).append(pk_row['column_name'])
+            
             # Process each table
             id_counter = 0
             for table_row in tables:
                 table_name = table_row['table_name']
+                pk_columns = primary_keys.get(table_name)
+                if pk_columns:
+                    row_expr = "concat_ws(',', " + ", ".join(f'"{c}"::text' for c in pk_columns) + ")"
+                else:
+                    row_expr = "NULL"
                 
                 # Get columns for this table
                 cursor.execute("""
@@ -65,27 +105,60 @@ def get_db_data():
                 # For each text column, get data
                 for col in text_columns:
                     # Handle cast columns
+                    numeric = col.startswith('CAST(')
                     display_col = col.split('::')[0] if '::' in col else col
-                    display_col = col.split(' AS ')[0] if ' AS ' in col else display_col
+                    display_col = col[len('CAST('):].split(' AS ')[0] if numeric else display_col
                     
                     try:
-                        cursor.execute(f"""
-                            SELECT {col} FROM {table_name}
-                            WHERE {col} IS NOT NULL AND {col}::text != ''
-                        """)
+                        with metrics.timer('db_fetch', labels={'table': table_name}):
+                            cursor.execute(f"""
+                                SELECT {row_expr} AS row_id, {col} AS value FROM {table_name}
+                                WHERE {col} IS NOT NULL AND {col}::text != ''
+                            """)
+                            rows = cursor.fetchall()
+                        metrics.inc('db_rows', len(rows), labels={'table': table_name})
                         
-                        for row in cursor.fetchall():
-                            content = str(list(row.values())[0])
-                            if content and len(content) > 0:
-                                id_counter += 1
-                                data.append({
-                                    'id': str(id_counter),
-                                    'table': table_name,
-                                    'column': display_col,
-                                    'content': content
-                                })
+                        for row in rows:
+                            content = str(row['value'])
+                            if not content:
+                                continue
+                            location = {
+                                'table': table_name,
+                                'column': display_col,
+                                'row': row['row_id']
+                            }
+                            
+                            key = None
+                            if DB_DEDUP:
+                                scope = f"{table_name}.{display_col}" if numeric else display_col
+                                key = content_hash(f"{scope}\x00{content}")
+                            if key is not None and key in by_hash:
+                                record = by_hash[key]
+                                record['occurrences'] += 1
+                                record['tables'].add(table_name)
+                                record['columns'].add(display_col)
+                                if len(record['locations']) < MAX_LOCATIONS:
+                                    record['locations'].append(location)
+                                metrics.inc('db_duplicate_values', labels={'table': table_name})
+                                continue
+                            
+                            id_counter += 1
+                            record = {
+                                'id': str(id_counter),
+                                'table': table_name,
+                                'column': display_col,
+                                'content': content,
+                                'occurrences': 1,
+                                'tables': {table_name},
+                                'columns': {display_col},
+                                'locations': [location]
+                            }
+                            data.append(record)
+                            if key is not None:
+                                by_hash[key] = record
                     except Exception as e:
                         print(f"Error processing {table_name}.{col}: {str(e)}")
+                        metrics.inc('db_fetch_errors', labels={'table': table_name})
                         
     except Exception as e:
         print(f"Database error: {str(e)}")
@@ -0,0 +1,85 @@
+import re
+import random
+import struct
+import hashlib
+
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# MinHash parameters: BANDS * ROWS_PER_BAND permutations
+NUM_PERMUTATIONS = 64
+BANDS = 16
+ROWS_PER_BAND = NUM_PERMUTATIONS // BANDS
+SHINGLE_SIZE = 5  # Words per shingle
+MERSENNE_PRIME = (1 << 61) - 1
+MAX_HASH = (1 << 32) - 1
+
+WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+def content_hash(text):
+    """Stable hash of a text value, used as the dedup key"""
+    return hashlib.sha1(text.encode('utf-8', errors='ignore')).hexdigest()
+
+def file_hash(filepath):
+    """Hash a file's bytes without loading it all into memory"""
+    digest = hashlib.sha1()
+    with open(filepath, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+class NearDuplicateIndex:
+    """Detect near-duplicate texts with MinHash signatures and LSH banding"""
+
+    def __init__(self, threshold=0.9, seed=1):
+        self.threshold = threshold
+        rng = random.Random(seed)
+        self.permutations = [(rng.randint(1, MERSENNE_PRIME - 1), rng.randint(0, MERSENNE_PRIME - 1))
+                             for _ in range(NUM_PERMUTATIONS)]
+        self.buckets = {}
+        self.signatures = {}
+
+    def _shingles(self, text):
+        words = WORD_RE.findall(text.lower())
+        if len(words) < SHINGLE_SIZE:
+            words_list = [' '.join(words)] if words else []
+        else:
+            words_list = [' '.join(words[i:i + SHINGLE_SIZE])
+                          for i in range(len(words) - SHINGLE_SIZE + 1)]
+        return {struct.unpack('<I', hashlib.md5(s.encode('utf-8')).digest()[:4])[0]
+                for s in words_list}
+
+    def signature(self, text):
+        shingles = self._shingles(text)
+        if not shingles:
+            return None
+        return [min(((a * s + b) % MERSENNE_PRIME) & MAX_HASH for s in shingles)
+                for a, b in self.permutations]
+
+    @staticmethod
+    def similarity(sig_a, sig_b):
+        """Estimated Jaccard similarity between two signatures"""
+        return sum(1 for x, y in zip(sig_a, sig_b) if x == y) / len(sig_a)
+
+    def find_or_add(self, key, text):
+        """Return the key of a near-duplicate already seen, or register this text and return None"""
+        sig = self.signature(text)
+        if sig is None:
+            return None
+
+        bands = [tuple(sig[i * ROWS_PER_BAND:(i + 1) * ROWS_PER_BAND]) for i in range(BANDS)]
+        candidates = set()
+        for i, band in enumerate(bands):
+            candidates.update(self.buckets.get((i, band), ()))
+
+        best_key, best_sim = None, 0.0
+        for candidate in candidates:
+            sim = self.similarity(sig, self.signatures[candidate])
+            if sim >= self.threshold and sim > best_sim:
+                best_key, best_sim = candidate, sim
+        if best_key is not None:
+            return best_key
+
+        self.signatures[key] = sig
+        for i, band in enumerate(bands):
+            self.buckets.setdefault((i, band), []).append(key)
+        return None
@@ -1,83 +1,217 @@
 import os
 import sys
 import io
-import PyPDF2
-from docx import Document as DocxDocument
+import time
+import zipfile
+import importlib
 import traceback
+from collections import Counter
 
-# Importaciones para Excel y PowerPoint
-try:
-    import openpyxl
-    EXCEL_SUPPORT = True
-except ImportError:
-    EXCEL_SUPPORT = False
-    print("Warning: openpyxl not installed. Excel support will be limited.")
-
-try:
-    from pptx import Presentation
-    PPT_SUPPORT = True
-except ImportError:
-    PPT_SUPPORT = False
-    print("Warning: python-pptx not installed. PowerPoint support will be limited.")
+# Allow running this module directly (python utils/<module>.py) as well as through the package
+if __package__ in (None, ''):
+    sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils.metrics import metrics
+from utils.dedup import file_hash, NearDuplicateIndex
+
+# Skip byte-identical files; NEAR_DUP_THRESHOLD (e.g. 0.9) also folds near-duplicates
+FILE_DEDUP = os.environ.get('FILE_DEDUP', 'true').lower() in ('1', 'true', 'yes', 'on')
+
+def _env_threshold(name):
+    """Read a 0-1 threshold from the environment, disabling the feature if it is malformed"""
+    raw = os.environ.get(name, '').strip()
+    if not raw:
+        return 0.0
+    try:
+        value = float(raw)
+    except ValueError:
+        print(f"Warning: invalid {name}={raw!r}, expected a number between 0 and 1. Disabling it.")
+        return 0.0
+    if not 0.0 <= value <= 1.0:
+        print(f"Warning: {name}={raw} is outside 0-1. Disabling it.")
+        return 0.0
+    return value
+
+NEAR_DUP_THRESHOLD = _env_threshold('NEAR_DUP_THRESHOLD')
+
+# Extractor registry: name -> {'func', 'extensions'}
+EXTRACTORS = {}
+# Extension -> extractor name
+EXTENSION_MAP = {}
+# Lazily imported backend modules (None when the import failed)
+_BACKENDS = {}
+
+# Magic-byte signatures checked before falling back to the extension
+PDF_SIGNATURE = b'%PDF'
+ZIP_SIGNATURE = b'PK\x03\x04'
+# Top-level folder inside an OOXML zip -> extractor name
+OOXML_PARTS = {
+    'word/': 'docx',
+    'xl/': 'excel',
+    'ppt/': 'ppt',
+}
+
+def register_extractor(name, extensions):
+    """Register an extraction function for the given file extensions"""
+    def decorator(func):
+        EXTRACTORS[name] = {'func': func, 'extensions': tuple(extensions)}
+        for ext in extensions:
+            EXTENSION_MAP[ext.lower()] = name
+        return func
+    return decorator
+
+def load_backend(module_name, package_hint=None):
+    """Import a backend library on first use and cache it (None if unavailable)"""
+    if module_name not in _BACKENDS:
+        start = time.perf_counter()
+        try:
+            _BACKENDS[module_name] = importlib.import_module(module_name)
+            metrics.add_time('backend_import', time.perf_counter() - start,
+                             labels={'module': module_name})
+        except ImportError:
+            _BACKENDS[module_name] = None
+            print(f"Warning: {package_hint or module_name} not installed. "
+                  f"Files that need it will be skipped.")
+    return _BACKENDS[module_name]
+
+def detect_extractor(filepath, extension):
+    """Pick an extractor name by file signature, falling back to the extension"""
+    try:
+        with open(filepath, 'rb') as f:
+            header = f.read(8)
+    except OSError:
+        header = b''
+
+    if header.startswith(PDF_SIGNATURE):
+        return 'pdf'
+
+    if header.startswith(ZIP_SIGNATURE):
+        try:
+            with zipfile.ZipFile(filepath) as archive:
+                for member in archive.namelist():
+                    for prefix, name in OOXML_PARTS.items():
+                        if member.startswith(prefix):
+                            return name
+        except zipfile.BadZipFile:
+            pass
+
+    return EXTENSION_MAP.get(extension)
+
+def extract_content(filepath, extension=None):
+    """Extract text from a file using the registered extractor for it"""
+    if extension is None:
+        extension = os.path.splitext(filepath)[1].lower()
+    name = detect_extractor(filepath, extension)
+    if name is None:
+        return ""
+    return EXTRACTORS[name]['func'](filepath)
 
 def process_documents(docs_dir):
-    """Process all documents in the given directory and return their content"""
+    """Process all documents in the given directory and return their content
+
+    Duplicate files are not returned separately; their paths are listed in
+    the 'duplicates' entry of the document they repeat.
+    """
     documents = []
+    by_hash = {}
+    by_path = {}
+    near_dups = NearDuplicateIndex(NEAR_DUP_THRESHOLD) if NEAR_DUP_THRESHOLD > 0 else None
     
     # Check if directory exists
     if not os.path.exists(docs_dir):
         print(f"Documents directory not found: {docs_dir}")
         return documents
     
-    # Walk through all files in the directory
+    # First pass: keep only files an extractor can handle. Unsupported files
+    # are never read beyond their signature bytes
+    candidates = []
     for root, _, files in os.walk(docs_dir):
         for filename in files:
             filepath = os.path.join(root, filename)
             extension = os.path.splitext(filename)[1].lower()
-            
             try:
-                # Process file based on extension
-                content = ""
-                
-                if extension == '.txt':
-                    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
-                        content = f.read()
-                
-                elif extension == '.pdf':
-                    content = extract_pdf_content(filepath)
-                
-                elif extension in ['.docx', '.doc']:
-                    content = extract_docx_content(filepath)
-                
-                elif extension in ['.xlsx', '.xls']:
-                    content = extract_excel_content(filepath)
-                
-                elif extension in ['.pptx', '.ppt']:
-                    content = extract_ppt_content(filepath)
-                
-                # Skip empty or unprocessable files
-                if not content or len(content.strip()) == 0:
-                    print(f"Skipping {filename}: No content extracted")
+                extractor = detect_extractor(filepath, extension)
+                if extractor is None:
+                    print(f"Skipping {filename}: unsupported file type")
+                    metrics.inc('files_unsupported', labels={'extension': extension or 'none'})
                     continue
-                
-                # Add to documents list
-                documents.append({
-                    'filename': filename,
-                    'path': filepath,
-                    'extension': extension,
-                    'content': content
-                })
-                
-                print(f"Processed {filename}: {len(content)} characters")
-                
-            except Exception as e:
-                print(f"Error processing {filename}: {str(e)}")
-                traceback.print_exc()
+                candidates.append((filepath, filename, extension, extractor, os.path.getsize(filepath)))
+            except OSError as e:
+                print(f"Error reading {filename}: {str(e)}")
+    
+    # Only files whose size matches another candidate can be byte-identical
+    size_counts = Counter(size for *_, size in candidates)
+    
+    for filepath, filename, extension, extractor, size in candidates:
+        try:
+            # Byte-identical copies are recorded on the first copy, not extracted again
+            key = file_hash(filepath) if FILE_DEDUP and size_counts[size] > 1 else None
+            if key is not None and key in by_hash:
+                by_hash[key]['duplicates'].append(filepath)
+                print(f"Skipping {filename}: duplicate of {by_hash[key]['path']}")
+                metrics.inc('duplicate_files', labels={'kind': 'exact'})
+                continue
+            
+            # Process file with the extractor matching its signature/extension
+            start = time.perf_counter()
+            content = EXTRACTORS[extractor]['func'](filepath)
+            
+            elapsed = time.perf_counter() - start
+            labels = {'extension': extension or 'none'}
+            metrics.add_time('extraction', elapsed, labels)
+            metrics.observe('extraction', elapsed, labels)
+            metrics.inc('files_seen', labels=labels)
+            
+            # Skip empty or unprocessable files
+            if not content or len(content.strip()) == 0:
+                print(f"Skipping {filename}: No content extracted")
+                metrics.inc('files_skipped', labels=labels)
+                continue
+            
+            if near_dups is not None:
+                original = near_dups.find_or_add(filepath, content)
+                if original is not None:
+                    by_path[original]['duplicates'].append(filepath)
+                    print(f"Skipping {filename}: near-duplicate of {original}")
+                    metrics.inc('duplicate_files', labels={'kind': 'near'})
+                    continue
+            
+            # Add to documents list
+            document = {
+                'filename': filename,
+                'path': filepath,
+                'extension': extension,
+                'content': content,
+                'duplicates': []
+            }
+            documents.append(document)
+            by_path[filepath] = document
+            if key is not None:
+                by_hash[key] = document
+            
+            metrics.inc('extracted_chars', len(content), labels=labels)
+            print(f"Processed {filename}: {len(content)} characters")
+            
+        except Exception as e:
+            print(f"Error processing {filename}: {str(e)}")
+            metrics.inc('extraction_errors', labels={'extension': extension or 'none'})
+            traceback.print_exc()
     
     return documents
 
+@register_extractor('txt', ['.txt'])
+def extract_txt_content(filepath):
+    """Extract text content from plain text file"""
+    with open(filepath, 'r', encoding='utf-8', errors='ignore') as f:
+        return f.read()
+
+@register_extractor('pdf', ['.pdf'])
 def extract_pdf_content(filepath):
     """Extract text content from PDF file"""
+    PyPDF2 = load_backend('PyPDF2')
+    if PyPDF2 is None:
+        return ""
+    
     try:
         with open(filepath, 'rb') as f:
             reader = PyPDF2.PdfReader(f)
@@ -90,10 +224,15 @@ def extract_pdf_content(filepath):
         print(f"PDF extraction error: {str(e)}")
         return ""
 
+@register_extractor('docx', ['.docx', '.doc'])
 def extract_docx_content(filepath):
     """Extract text content from DOCX file"""
+    docx = load_backend('docx', 'python-docx')
+    if docx is None:
+        return ""
+    
     try:
-        doc = DocxDocument(filepath)
+        doc = docx.Document(filepath)
         full_text = []
         for para in doc.paragraphs:
             full_text.append(para.text)
@@ -102,10 +241,11 @@ def extract_docx_content(filepath):
         print(f"DOCX extraction error: {str(e)}")
         return ""
 
+@register_extractor('excel', ['.xlsx', '.xls'])
 def extract_excel_content(filepath):
     """Extract text content from Excel file"""
-    if not EXCEL_SUPPORT:
-        print("Excel support not available. Please install openpyxl.")
+    openpyxl = load_backend('openpyxl')
+    if openpyxl is None:
         return ""
     
     try:
@@ -134,14 +274,15 @@ def extract_excel_content(filepath):
         traceback.print_exc()
         return ""
 
+@register_extractor('ppt', ['.pptx', '.ppt'])
 def extract_ppt_content(filepath):
     """Extract text content from PowerPoint file"""
-    if not PPT_SUPPORT:
-        print("PowerPoint support not available. Please install python-pptx.")
+    pptx = load_backend('pptx', 'python-pptx')
+    if pptx is None:
         return ""
     
     try:
-        presentation = Presentation(filepath)
+        presentation = pptx.Presentation(filepath)
         full_text = []
         
         # Process title and subtitle on each slide
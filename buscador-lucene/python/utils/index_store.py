@@ -0,0 +1,159 @@
+import os
+import time
+import shutil
+from datetime import datetime
+
+# Index layout: INDEX_DIR/gen-<timestamp>/ holds one complete index and
+# INDEX_DIR/CURRENT names the generation readers should open.
+POINTER_FILE = 'CURRENT'
+GENERATION_PREFIX = 'gen-'
+SUGGEST_FILENAME = 'suggestions.json'
+
+INDEX_DIRECTORY = os.environ.get('INDEX_DIRECTORY', 'fs').lower()  # fs | mmap | nio | simple
+try:
+    INDEX_KEEP_GENERATIONS = max(1, int(os.environ.get('INDEX_KEEP_GENERATIONS', '2')))
+except ValueError:
+    print("Warning: invalid INDEX_KEEP_GENERATIONS, keeping 2 generations")
+    INDEX_KEEP_GENERATIONS = 2
+# os.replace over CURRENT fails on Windows while a reader has it open; retry with backoff
+PUBLISH_ATTEMPTS = 10
+PUBLISH_RETRY_DELAY = 0.05
+WARMUP_QUERIES = [q for q in os.environ.get('WARMUP_QUERIES', '').split(',') if q.strip()]
+
+def open_directory(path):
+    """Open a Lucene Directory using the implementation chosen by INDEX_DIRECTORY"""
+    # Imported here so suggest.py can resolve index paths without the JVM
+    from java.nio.file import Paths
+    from org.apache.lucene.store import FSDirectory, MMapDirectory, NIOFSDirectory, SimpleFSDirectory
+
+    directories = {
+        'fs': FSDirectory.open,
+        'mmap': MMapDirectory,
+        'nio': NIOFSDirectory,
+        'simple': SimpleFSDirectory,
+    }
+    if INDEX_DIRECTORY not in directories:
+        raise ValueError(f"Unknown INDEX_DIRECTORY '{INDEX_DIRECTORY}', expected one of {', '.join(directories)}")
+    return directories[INDEX_DIRECTORY](Paths.get(path))
+
+def current_index_path(index_root):
+    """Return the directory of the published index generation
+
+    Falls back to index_root itself for indexes built before generations existed.
+    """
+    pointer = os.path.join(index_root, POINTER_FILE)
+    try:
+        with open(pointer, 'r', encoding='utf-8') as f:
+            generation = f.read().strip()
+    except OSError:
+        return index_root
+    return os.path.join(index_root, generation) if generation else index_root
+
+def new_generation_path(index_root):
+    """Create and return an empty directory for the next index generation"""
+    name = f"{GENERATION_PREFIX}{datetime.now().strftime('%Y%m%d%H%M%S%f')}"
+    path = os.path.join(index_root, name)
+    os.makedirs(path)
+    return path
+
+def list_generations(index_root):
+    """Generation directory names, oldest first"""
+    if not os.path.isdir(index_root):
+        return []
+    return sorted(name for name in os.listdir(index_root)
+                  if name.startswith(GENERATION_PREFIX)
+                  and os.path.isdir(os.path.join(index_root, name)))
+
+def publish_generation(index_root, generation_path):
+    """Atomically point readers at a finished generation"""
+    pointer = os.path.join(index_root, POINTER_FILE)
+    tmp_pointer = f"{pointer}.tmp"
+    with open(tmp_pointer, 'w', encoding='utf-8') as f:
+        f.write(os.path.basename(generation_path))
+        f.flush()
+        os.fsync(f.fileno())
+    for attempt in range(PUBLISH_ATTEMPTS):
+        try:
+            os.replace(tmp_pointer, pointer)
+            return
+        except PermissionError:
+            if attempt == PUBLISH_ATTEMPTS - 1:
+                raise
+            time.sleep(PUBLISH_RETRY_DELAY * (attempt + 1))
+
+def cleanup_generations(index_root, keep=INDEX_KEEP_GENERATIONS):
+    """Delete old generations, keeping the current one and the newest `keep` overall
+
+    Generations newer than the current one may still be being built and are left alone.
+    Index files left in index_root by the pre-generation layout are removed too.
+    """
+    current = os.path.basename(current_index_path(index_root))
+    generations = list_generations(index_root)
+    if current not in generations:
+        return []
+    removed = remove_legacy_index(index_root)
+
+    older = generations[:generations.index(current)]
+    # The previous generation stays around for readers that resolved the pointer just before the swap
+    stale = older[:max(0, len(older) - (keep - 1))]
+    for name in stale:
+        try:
+            shutil.rmtree(os.path.join(index_root, name))
+            removed.append(name)
+        except OSError as e:
+            # Files still open by a reader (e.g. on Windows); retried after the next rebuild
+            print(f"Could not remove old index generation {name}: {str(e)}")
+    return removed
+
+def is_legacy_index_file(name):
+    """Lucene files (segments_N, _0.cfs, write.lock...) written directly into index_root"""
+    return name.startswith(('segments', '_', 'pending_segments')) or name == 'write.lock'
+
+def remove_legacy_index(index_root):
+    """Delete an index built in place before generations existed
+
+    Only called once CURRENT points at a generation, so no reader opens these files any more.
+    Files still held open (e.g. on Windows) are retried after the next rebuild.
+    """
+    removed = []
+    for name in os.listdir(index_root):
+        path = os.path.join(index_root, name)
+        if not os.path.isfile(path) or not is_legacy_index_file(name):
+            continue
+        try:
+            os.remove(path)
+            removed.append(name)
+        except OSError as e:
+            print(f"Could not remove legacy index file {name}: {str(e)}")
+    return removed
+
+def discard_generation(generation_path):
+    """Remove a generation whose build failed"""
+    shutil.rmtree(generation_path, ignore_errors=True)
+
+def warm_up(generation_path, analyzer):
+    """Open a finished generation and run a few queries so its files are cached"""
+    from org.apache.lucene.index import DirectoryReader
+    from org.apache.lucene.search import IndexSearcher, MatchAllDocsQuery
+    from org.apache.lucene.queryparser.classic import QueryParser
+
+    directory = open_directory(generation_path)
+    reader = DirectoryReader.open(directory)
+    try:
+        searcher = IndexSearcher(reader)
+        queries = [MatchAllDocsQuery()]
+        parser = QueryParser("content", analyzer)
+        for query_str in WARMUP_QUERIES:
+            try:
+                queries.append(parser.parse(query_str.strip()))
+            except Exception as e:
+                print(f"Skipping warm-up query '{query_str}': {str(e)}")
+
+        for query in queries:
+            top_docs = searcher.search(query, 10)
+            for score_doc in top_docs.scoreDocs:
+                searcher.doc(score_doc.doc)
+        return reader.numDocs()
+    finally:
+        reader.close()
+        directory.close()
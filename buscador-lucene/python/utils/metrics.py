@@ -0,0 +1,296 @@
+import os
+import json
+import time
+import threading
+import cProfile
+import pstats
+from contextlib import contextmanager
+
+# OS-level file locks are released automatically if the holder crashes
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+    import msvcrt
+
+# Histogram buckets (seconds) used for latency observations
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+METRIC_PREFIX = 'buscador'
+
+
+class Metrics:
+    """Collect counters, stage timers and latency histograms for a single run"""
+
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.runs = 1
+        self.counters = {}
+        self.timers = {}
+        self.histograms = {}
+        self.started_at = time.perf_counter()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _key(name, labels):
+        return (name, tuple(sorted((labels or {}).items())))
+
+    def inc(self, name, value=1, labels=None):
+        """Increment a counter"""
+        key = self._key(name, labels)
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def add_time(self, name, seconds, labels=None):
+        """Accumulate elapsed seconds for a stage"""
+        key = self._key(name, labels)
+        with self._lock:
+            total, calls = self.timers.get(key, (0.0, 0))
+            self.timers[key] = (total + seconds, calls + 1)
+
+    def observe(self, name, seconds, labels=None):
+        """Record a latency observation in a histogram"""
+        key = self._key(name, labels)
+        with self._lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+                self.histograms[key] = hist
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    hist['counts'][i] += 1
+            hist['sum'] += seconds
+            hist['count'] += 1
+
+    @contextmanager
+    def timer(self, name, labels=None, histogram=False):
+        """Time a block of code as a stage (and optionally as a histogram sample)"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.add_time(name, elapsed, labels)
+            if histogram:
+                self.observe(name, elapsed, labels)
+
+    def stage_seconds(self, name):
+        """Total seconds spent in a stage, summed over all label sets"""
+        return sum(total for (key, _), (total, _) in self.timers.items() if key == name)
+
+    def counter_value(self, name):
+        """Total value of a counter, summed over all label sets"""
+        return sum(value for (key, _), value in self.counters.items() if key == name)
+
+    def elapsed(self):
+        return time.perf_counter() - self.started_at
+
+    def to_dict(self):
+        """Return all metrics as a JSON-serialisable dictionary"""
+        def fmt(key):
+            name, labels = key
+            entry = {'name': name}
+            if labels:
+                entry['labels'] = dict(labels)
+            return entry
+
+        with self._lock:
+            counters = [dict(fmt(k), value=v) for k, v in self.counters.items()]
+            timers = [dict(fmt(k), seconds=round(total, 6), calls=calls)
+                      for k, (total, calls) in self.timers.items()]
+            histograms = []
+            for k, hist in self.histograms.items():
+                buckets = {str(b): c for b, c in zip(self.buckets, hist['counts'])}
+                buckets['+Inf'] = hist['count']
+                histograms.append(dict(fmt(k), buckets=buckets,
+                                       sum=round(hist['sum'], 6), count=hist['count']))
+
+        return {
+            'runs': self.runs,
+            'elapsed_seconds': round(self.elapsed(), 6),
+            'counters': counters,
+            'timers': timers,
+            'histograms': histograms,
+        }
+
+    def merge(self, data):
+        """Add the metrics from a to_dict() snapshot into this registry"""
+        def key(entry):
+            return self._key(entry['name'], entry.get('labels'))
+
+        bounds = [str(b) for b in self.buckets]
+        with self._lock:
+            self.runs += data.get('runs', 1)
+            for entry in data.get('counters', []):
+                k = key(entry)
+                self.counters[k] = self.counters.get(k, 0) + entry['value']
+            for entry in data.get('timers', []):
+                k = key(entry)
+                total, calls = self.timers.get(k, (0.0, 0))
+                self.timers[k] = (total + entry['seconds'], calls + entry['calls'])
+            for entry in data.get('histograms', []):
+                k = key(entry)
+                hist = self.histograms.setdefault(
+                    k, {'counts': [0] * len(self.buckets), 'sum': 0.0, 'count': 0})
+                for i, bound in enumerate(bounds):
+                    hist['counts'][i] += entry['buckets'].get(bound, 0)
+                hist['sum'] += entry['sum']
+                hist['count'] += entry['count']
+
+    def to_prometheus(self):
+        """Return all metrics in the Prometheus text exposition format"""
+        def labels_str(labels, extra=None):
+            items = list(labels) + list(extra or [])
+            if not items:
+                return ''
+            parts = []
+            for k, v in items:
+                value = str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+                parts.append(f'{k}="{value}"')
+            return '{' + ','.join(parts) + '}'
+
+        lines = []
+        seen = set()
+
+        def type_line(name, kind):
+            if name not in seen:
+                seen.add(name)
+                lines.append(f'# TYPE {name} {kind}')
+
+        with self._lock:
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = f'{METRIC_PREFIX}_{name}_total'
+                type_line(metric, 'counter')
+                lines.append(f'{metric}{labels_str(labels)} {value}')
+
+            # Each metric family must be one contiguous group, so seconds and
+            # calls are written in separate passes
+            timers = sorted(self.timers.items())
+            for (name, labels), (total, _) in timers:
+                metric = f'{METRIC_PREFIX}_{name}_stage_seconds_total'
+                type_line(metric, 'counter')
+                lines.append(f'{metric}{labels_str(labels)} {total:.6f}')
+            for (name, labels), (_, calls) in timers:
+                metric = f'{METRIC_PREFIX}_{name}_stage_calls_total'
+                type_line(metric, 'counter')
+                lines.append(f'{metric}{labels_str(labels)} {calls}')
+
+            for (name, labels), hist in sorted(self.histograms.items()):
+                metric = f'{METRIC_PREFIX}_{name}_seconds'
+                type_line(metric, 'histogram')
+                for bound, count in zip(self.buckets, hist['counts']):
+                    lines.append(f'{metric}_bucket{labels_str(labels, [("le", bound)])} {count}')
+                lines.append(f'{metric}_bucket{labels_str(labels, [("le", "+Inf")])} {hist["count"]}')
+                lines.append(f'{metric}_sum{labels_str(labels)} {hist["sum"]:.6f}')
+                lines.append(f'{metric}_count{labels_str(labels)} {hist["count"]}')
+
+        return '\n'.join(lines) + '\n'
+
+    def dump(self, name, path=None, fmt=None):
+        """Merge this run into the metrics file for `name` and rewrite it atomically
+
+        METRICS_FILE may contain a {name} placeholder; otherwise the script name
+        is added before the extension, so index.py and search.py never share a
+        file. Totals and histograms accumulate across runs. The cumulative state
+        is kept as JSON; with METRICS_FORMAT=prometheus it is kept in
+        <file>.json and the Prometheus text is rendered from it.
+        """
+        path = path or os.environ.get('METRICS_FILE')
+        if not path:
+            return None
+        if '{name}' in path:
+            path = path.replace('{name}', name)
+        else:
+            base, ext = os.path.splitext(path)
+            path = f"{base}-{name}{ext}"
+        fmt = (fmt or os.environ.get('METRICS_FORMAT', 'json')).lower()
+        prometheus = fmt in ('prometheus', 'prom', 'text')
+        state_path = f"{path}.json" if prometheus else path
+
+        try:
+            with _file_lock(path):
+                merged = Metrics(self.buckets)
+                merged.runs = 0
+                try:
+                    with open(state_path, 'r', encoding='utf-8') as f:
+                        merged.merge(json.load(f))
+                except FileNotFoundError:
+                    pass
+                except (ValueError, KeyError) as e:
+                    print(f"Ignoring unreadable metrics file {state_path}: {str(e)}")
+                    merged = Metrics(self.buckets)
+                    merged.runs = 0
+                merged.merge(self.to_dict())
+                merged.started_at = self.started_at
+
+                _write_atomic(state_path, json.dumps(merged.to_dict(), indent=2))
+                if prometheus:
+                    _write_atomic(path, merged.to_prometheus())
+        except OSError as e:
+            print(f"Error writing metrics to {path}: {str(e)}")
+            return None
+        return path
+
+
+def _write_atomic(path, payload):
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+@contextmanager
+def _file_lock(path):
+    """Exclusive cross-process lock on <path>.lock so concurrent runs do not lose updates
+
+    The lock file is never deleted: removing it would let a waiting process
+    lock a different inode than the next one. On Windows, msvcrt retries for
+    about 10 seconds and then raises OSError, which dump() reports and skips.
+    """
+    lock_path = f"{path}.lock"
+    with open(lock_path, 'a+') as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+# Process-wide metrics registry shared by index.py, search.py and utils
+metrics = Metrics()
+
+
+@contextmanager
+def profiling(name):
+    """Profile the wrapped block with cProfile when PROFILE is enabled
+
+    PROFILE=1 writes <PROFILE_DIR>/<name>.prof (loadable with snakeviz/pstats).
+    When running under py-spy, leave PROFILE unset; stage names in the
+    metrics dump line up with the function names py-spy reports.
+    """
+    enabled = os.environ.get('PROFILE', '').lower() in ('1', 'true', 'yes', 'on')
+    if not enabled:
+        yield None
+        return
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield profiler
+    finally:
+        profiler.disable()
+        profile_dir = os.environ.get('PROFILE_DIR', '.')
+        os.makedirs(profile_dir, exist_ok=True)
+        out_path = os.path.join(profile_dir, f"{name}.prof")
+        profiler.dump_stats(out_path)
+        print(f"Profile written to {out_path}")
+        if os.environ.get('PROFILE_PRINT', '').lower() in ('1', 'true', 'yes', 'on'):
+            pstats.Stats(profiler).sort_stats('cumulative').print_stats(25)
@@ -0,0 +1,117 @@
+import os
+import re
+import json
+import heapq
+import bisect
+import unicodedata
+from collections import Counter
+
+# Weights per suggestion source
+FILENAME_WEIGHT = 50
+VALUE_WEIGHT = 5
+TERM_WEIGHT = 1
+
+MAX_VALUE_LENGTH = 60  # Longer table values are not useful as suggestions
+MIN_TERM_LENGTH = 3
+MAX_CONTENT_TERMS = 20000  # Keep only the most frequent content terms
+PRECOMPUTED_PREFIX_LENGTH = 2  # Top-k for short prefixes is ranked at index time
+DEFAULT_LIMIT = 10
+
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+NUMERIC_RE = re.compile(r'^[\d\s.,:/+-]+$')  # ids, amounts, dates: not useful to type ahead
+
+def normalize(text):
+    """Lowercase and strip accents so 'Título' matches 'titulo'"""
+    text = unicodedata.normalize('NFKD', text.lower())
+    return ''.join(c for c in text if not unicodedata.combining(c)).strip()
+
+class SuggestionBuilder:
+    """Accumulate weighted suggestions while the index is being built"""
+
+    def __init__(self):
+        self.weights = Counter()
+        self.display = {}
+        self.term_counts = Counter()
+
+    def _add(self, text, weight):
+        text = ' '.join(text.split())
+        key = normalize(text)
+        if not key:
+            return
+        self.weights[key] += weight
+        self.display.setdefault(key, text)
+
+    def add_filename(self, filename):
+        self._add(filename, FILENAME_WEIGHT)
+        self._add(os.path.splitext(filename)[0], FILENAME_WEIGHT)
+
+    def add_value(self, value, occurrences=1):
+        # Numeric ids and foreign keys repeat a lot and would crowd out short prefixes
+        if len(value) <= MAX_VALUE_LENGTH and not NUMERIC_RE.match(value):
+            self._add(value, VALUE_WEIGHT * occurrences)
+
+    def add_content(self, content):
+        # Count each term once per document (document frequency)
+        terms = {t for t in TOKEN_RE.findall(content.lower())
+                 if len(t) >= MIN_TERM_LENGTH and not t.isdigit()}
+        self.term_counts.update(terms)
+
+    def build(self):
+        """Return the final sorted list of [key, display, weight] entries"""
+        weights = Counter(self.weights)
+        display = dict(self.display)
+        for term, count in self.term_counts.most_common(MAX_CONTENT_TERMS):
+            key = normalize(term)
+            weights[key] += count * TERM_WEIGHT
+            display.setdefault(key, term)
+        return [[key, display[key], weights[key]] for key in sorted(weights)]
+
+    def save(self, path):
+        """Write the suggestions next to the index and return the entry count"""
+        entries = self.build()
+        prefix_top = Suggester(entries).rank_short_prefixes()
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': entries, 'prefix_top': prefix_top}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        return len(entries)
+
+class Suggester:
+    """In-memory prefix lookup over the suggestions built at index time"""
+
+    def __init__(self, entries, prefix_top=None):
+        self.keys = [e[0] for e in entries]
+        self.display = [e[1] for e in entries]
+        self.weights = [e[2] for e in entries]
+        self.prefix_top = prefix_top or {}
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['entries'], data.get('prefix_top'))
+
+    def _range(self, prefix):
+        lo = bisect.bisect_left(self.keys, prefix)
+        hi = bisect.bisect_left(self.keys, prefix + '\U0010ffff')
+        return lo, hi
+
+    def _top(self, lo, hi, limit):
+        return heapq.nlargest(limit, range(lo, hi), key=self.weights.__getitem__)
+
+    def rank_short_prefixes(self):
+        """Rank the top entries for every short prefix (these match large ranges)"""
+        prefixes = {k[:n] for k in self.keys for n in range(1, PRECOMPUTED_PREFIX_LENGTH + 1)}
+        return {p: self._top(*self._range(p), DEFAULT_LIMIT) for p in prefixes}
+
+    def suggest(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to `limit` suggestions for a prefix, highest weight first"""
+        key = normalize(prefix)
+        if not key:
+            return []
+        if limit <= DEFAULT_LIMIT and key in self.prefix_top:
+            indexes = self.prefix_top[key][:limit]
+        else:
+            lo, hi = self._range(key)
+            indexes = self._top(lo, hi, limit)
+        return [{'text': self.display[i], 'weight': self.weights[i]} for i in indexes]
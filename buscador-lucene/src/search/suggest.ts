@@ -0,0 +1,157 @@
+import { spawn, ChildProcessWithoutNullStreams } from "child_process";
+import path from "path";
+import readline from "readline";
+import dotenv from "dotenv";
+
+dotenv.config();
+
+// Directorio de los scripts de Python (suggest.py resuelve ../index desde aquí)
+const PYTHON_DIR = path.join(__dirname, "..", "..", "python");
+const PYTHON_SUGGEST_SCRIPT = path.join(PYTHON_DIR, "suggest.py");
+// Comando Python (puede configurarse en .env)
+const PYTHON_CMD = process.env.PYTHON_CMD || "python";
+// Tiempo máximo de espera por una respuesta una vez cargadas las sugerencias
+const SUGGEST_TIMEOUT_MS = Number(process.env.SUGGEST_TIMEOUT_MS) || 1000;
+// Tiempo máximo para la carga inicial del archivo de sugerencias (puede ser grande)
+const SUGGEST_STARTUP_TIMEOUT_MS = Number(process.env.SUGGEST_STARTUP_TIMEOUT_MS) || 30000;
+
+type Pending = {
+  resolve: (value: any) => void;
+  reject: (error: Error) => void;
+  timer?: NodeJS.Timeout;
+};
+
+// Proceso residente: carga las sugerencias una sola vez y responde una línea JSON por consulta.
+// Cada proceso tiene su propia cola, así un proceso que muere no afecta al siguiente.
+type Worker = {
+  child: ChildProcessWithoutNullStreams;
+  pending: Pending[];
+  ready: Promise<void>;
+  alive: boolean;
+};
+
+let worker: Worker | null = null;
+
+function stopWorker(current: Worker, error: Error) {
+  if (worker === current) {
+    worker = null;
+  }
+  if (current.alive) {
+    current.alive = false;
+    current.child.kill();
+  }
+  while (current.pending.length > 0) {
+    const request = current.pending.shift()!;
+    if (request.timer) {
+      clearTimeout(request.timer);
+    }
+    request.reject(error);
+  }
+}
+
+function startWorker(): Worker {
+  const child = spawn(PYTHON_CMD, [PYTHON_SUGGEST_SCRIPT, "--serve"], { cwd: PYTHON_DIR });
+  let markReady: () => void = () => {};
+  let failReady: (error: Error) => void = () => {};
+  const ready = new Promise<void>((resolve, reject) => {
+    markReady = resolve;
+    failReady = reject;
+  });
+  // Evita un rechazo no manejado si nadie espera la carga inicial
+  ready.catch(() => {});
+
+  const current: Worker = { child, pending: [], ready, alive: true };
+  let readySeen = false;
+
+  const startupTimer = setTimeout(() => {
+    const error = new Error("Tiempo de espera agotado al cargar las sugerencias");
+    failReady(error);
+    stopWorker(current, error);
+  }, SUGGEST_STARTUP_TIMEOUT_MS);
+
+  // La primera línea indica que terminó la carga inicial; las siguientes son respuestas en orden
+  readline.createInterface({ input: child.stdout }).on("line", (line) => {
+    if (!readySeen) {
+      readySeen = true;
+      clearTimeout(startupTimer);
+      try {
+        const status = JSON.parse(line);
+        if (!status.ready) {
+          console.error("Error al cargar las sugerencias:", status.error);
+        }
+      } catch (error) {
+        console.error(`Línea inicial inválida del proceso de sugerencias: ${line}`);
+      }
+      markReady();
+      return;
+    }
+
+    const request = current.pending.shift();
+    if (!request) {
+      return;
+    }
+    if (request.timer) {
+      clearTimeout(request.timer);
+    }
+    try {
+      request.resolve(JSON.parse(line));
+    } catch (error) {
+      request.reject(new Error(`Respuesta inválida del proceso de sugerencias: ${line}`));
+    }
+  });
+
+  child.stderr.on("data", (data) => {
+    console.error(`suggest.py: ${data}`);
+  });
+
+  // Escribir en un proceso que terminó produce EPIPE; sin este manejador tumbaría el servidor
+  child.stdin.on("error", (error) => {
+    console.error("Error de escritura al proceso de sugerencias:", error);
+    failReady(error);
+    stopWorker(current, error);
+  });
+
+  child.on("exit", (code) => {
+    console.error(`El proceso de sugerencias terminó con código ${code}`);
+    clearTimeout(startupTimer);
+    current.alive = false;
+    const error = new Error("El proceso de sugerencias terminó");
+    failReady(error);
+    stopWorker(current, error);
+  });
+
+  child.on("error", (error) => {
+    console.error("Error al iniciar el proceso de sugerencias:", error);
+    clearTimeout(startupTimer);
+    current.alive = false;
+    failReady(error);
+    stopWorker(current, error);
+  });
+
+  return current;
+}
+
+export async function suggest(prefix: string, limit = 10): Promise<any> {
+  if (!worker) {
+    worker = startWorker();
+  }
+  const current = worker;
+  await current.ready;
+
+  return new Promise((resolve, reject) => {
+    if (!current.alive || !current.child.stdin.writable) {
+      reject(new Error("El proceso de sugerencias no está disponible"));
+      return;
+    }
+
+    const request: Pending = { resolve, reject };
+    // El tiempo de espera empieza cuando el proceso ya está listo
+    request.timer = setTimeout(() => {
+      // Un proceso que no responde se descarta; la próxima consulta inicia otro
+      stopWorker(current, new Error("Tiempo de espera agotado en sugerencias"));
+    }, SUGGEST_TIMEOUT_MS);
+
+    current.pending.push(request);
+    current.child.stdin.write(JSON.stringify({ q: prefix, limit }) + "\n");
+  });
+}
@@ -1,5 +1,6 @@
 import express from "express";
 import { searchDatabaseAndDocuments } from "./search/databaseSearch";
+import { suggest } from "./search/suggest";
 import cors from "cors";
 import path from "path";
 
@@ -16,6 +17,7 @@ app.get("/", (req, res) => {
     <h1>Buscador</h1>
     <p>API de búsqueda en base de datos y documentos</p>
     <p>Use /search?q=término para realizar búsquedas</p>
+    <p>Use /suggest?q=prefijo para obtener sugerencias</p>
   `);
 });
 
@@ -50,6 +52,29 @@ app.get("/search", async (req, res) => {
   }
 });
 
+// Endpoint de sugerencias (autocompletado)
+app.get("/suggest", async (req, res) => {
+  try {
+    const prefix = req.query.q as string;
+
+    if (!prefix) {
+      return res.status(400).json({ 
+        error: "Query parameter 'q' is required",
+        usage: "/suggest?q=prefijo" 
+      });
+    }
+
+    const limit = Number(req.query.limit) || 10;
+    res.json(await suggest(prefix, limit));
+  } catch (error) {
+    console.error("Error en sugerencias:", error);
+    res.status(500).json({ 
+      error: "Error en sugerencias",
+      mensaje: error instanceof Error ? error.message : "Error desconocido"
+    });
+  }
+});
+
 app.listen(PORT, () => {
   console.log(`Server running on http://localhost:${PORT}`);
   console.log(`Try http://localhost:${PORT}/search?q=test`);